@@ -1,6 +1,7 @@
-# composer.py – build the Telegram post and send it
+# composer.py – build the Telegram post and queue it in the outbox
 import os, yaml
 from telegram import Bot
+import outbox
 
 with open("config.yaml", "r", encoding="utf-8") as _f:
     _CONFIG = yaml.safe_load(_f)
@@ -67,14 +68,17 @@ async def compose_and_send(city_key: str,
     else:
         cta = f'🔔 {LOCAL_CTA_TEXT.get(lang, LOCAL_CTA_TEXT["en"])} 👈'
 
-    header = f'📰 <b>{_display_city(city_key)} {label}</b>\n\n'
-    body = "\n\n".join(line for line in news_lines if line)
-    text   = header + body + (f"\n\n{extras}" if extras else "") + f"\n\n{cta}"
+    header = f'📰 <b>{_display_city(city_key)} {label}</b>'
+    blocks = [header, *(line for line in news_lines if line)]
+    if extras:
+        blocks.append(extras)
+    blocks.append(cta)
 
-    await BOT.send_message(
-        chat_id=int(chat) if chat.lstrip("-").isdigit() else chat,
-        text=text,
-        parse_mode="HTML",
-        disable_web_page_preview=False,
-    )
+    # queue first so the post survives a failed send or a restart
+    outbox.enqueue(int(chat) if chat.lstrip("-").isdigit() else chat, blocks)
+    await outbox.flush(BOT)
+
+async def flush_outbox():
+    """Retry posts still waiting in the outbox (failed sends, flood waits, restarts)."""
+    await outbox.flush(BOT)
 
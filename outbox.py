@@ -0,0 +1,228 @@
+# outbox.py – persistent queue of composed posts, sent under Telegram's rate limits
+import os, re, json, time, uuid, asyncio
+from telegram.error import (RetryAfter, ChatMigrated, Forbidden, BadRequest,
+                            InvalidToken, TelegramError)
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH") or "outbox.json"
+
+MAX_MESSAGE_LEN = 4096          # Telegram hard limit for one text message
+MAX_ATTEMPTS    = 8             # transient failures before a post is dropped
+BACKOFF_BASE    = 5             # seconds, doubled per failed attempt
+BACKOFF_MAX     = 15 * 60
+
+GLOBAL_RATE   = 30              # messages / second across all chats
+CHANNEL_DELAY = 3.0             # groups & channels: 20 messages / minute
+PRIVATE_DELAY = 1.0             # private chats: 1 message / second
+
+# ------------------------------------------------ rate limiting
+class _Limiter:
+    """Spaces calls at least `interval` seconds apart; `pause` pushes the next slot back."""
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = max(time.monotonic(), self._next) + self._interval
+
+    def pause(self, seconds: float):
+        self._next = max(self._next, time.monotonic() + seconds)
+
+_GLOBAL = _Limiter(1 / GLOBAL_RATE)
+_PER_CHAT: dict[str, _Limiter] = {}
+
+def _chat_limiter(chat: int | str) -> _Limiter:
+    key = str(chat)
+    if key not in _PER_CHAT:
+        private = isinstance(chat, int) and chat > 0
+        _PER_CHAT[key] = _Limiter(PRIVATE_DELAY if private else CHANNEL_DELAY)
+    return _PER_CHAT[key]
+
+def _seconds(retry_after) -> float:
+    # PTB exposes retry_after as int or timedelta depending on the version
+    return float(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+
+# ------------------------------------------------ splitting
+_TOKEN = re.compile(r"<[^>]*>|&#?\w+;")       # tags and entities are never split
+_TAG   = re.compile(r"<\s*(/?)\s*([\w-]+)")    # incl. tg-spoiler, tg-emoji
+BREAK_WINDOW = 200                            # how far back a line/word break may pull a cut
+
+def _safe_cut(text: str, limit: int) -> tuple[int, list[tuple[str, str]]] | None:
+    """Last position where `text` can be cut with its open tags closed inside `limit` chars.
+
+    Prefers a line/word break within BREAK_WINDOW chars of the furthest possible cut;
+    otherwise cuts at that furthest position outside a tag or entity.
+    Returns the position and the tags open there as (name, opening tag), or None.
+    """
+    stack: list[tuple[str, str]] = []
+    best_ws = best_any = None
+    pos = 0
+    for m in [*_TOKEN.finditer(text), None]:
+        end = m.start() if m else len(text)
+        closing = sum(len(name) + 3 for name, _ in stack)
+        reopen = sum(len(tag) for _, tag in stack)
+        hi = min(end, limit - closing)
+        if hi >= pos and hi > reopen:
+            best_any = (hi, stack[:])
+            ws = max(text.rfind("\n", pos, hi), text.rfind(" ", pos, hi))
+            if ws > reopen:
+                best_ws = (ws, stack[:])
+        if m is None or m.end() > limit:
+            break
+        tag = _TAG.match(m.group())
+        if tag and not m.group().endswith("/>"):
+            closing_tag, name = tag.groups()
+            if not closing_tag:
+                stack.append((name.lower(), m.group()))
+            elif any(n == name.lower() for n, _ in stack):
+                while stack.pop()[0] != name.lower():
+                    pass
+        pos = m.end()
+    if best_ws and best_any[0] - best_ws[0] <= BREAK_WINDOW:
+        return best_ws
+    return best_any
+
+def _cut(text: str, limit: int) -> list[str]:
+    """Split one oversized block so every piece is valid Telegram HTML.
+
+    Cuts land on a line/word break near the limit if there is one, and never
+    inside a tag or an entity; tags open at a cut are closed at the end of the
+    piece and reopened at the start of the next. If no such cut exists (e.g. a single tag longer
+    than `limit`), the block's markup is dropped and it is cut as plain text.
+    """
+    pieces = []
+    while len(text) > limit:
+        found = _safe_cut(text, limit)
+        if found is None:
+            print("⚠️ Oversized HTML block cannot be split safely – sending it without markup.")
+            text = re.sub(r"<[^>]*>", "", text)
+            continue
+        cut, open_tags = found
+        pieces.append(text[:cut].rstrip() + "".join(f"</{name}>" for name, _ in reversed(open_tags)))
+        text = "".join(tag for _, tag in open_tags) + text[cut:].lstrip()
+    return pieces + [text] if text else pieces
+
+def split_message(blocks: list[str], limit: int = MAX_MESSAGE_LEN, sep: str = "\n\n") -> list[str]:
+    """Pack `blocks` (header, news items, extras, CTA) into messages of at most `limit` chars.
+
+    Blocks are only split internally when a single one exceeds the limit on its own.
+    """
+    parts, current = [], ""
+    for block in blocks:
+        for piece in (_cut(block, limit) if len(block) > limit else [block]):
+            if current and len(current) + len(sep) + len(piece) > limit:
+                parts.append(current)
+                current = piece
+            else:
+                current = current + sep + piece if current else piece
+    if current:
+        parts.append(current)
+    return parts
+
+# ------------------------------------------------ persistence
+def _load() -> list[dict]:
+    try:
+        with open(OUTBOX_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        print(f"⚠️ Outbox file {OUTBOX_PATH} unreadable ({e}) – starting empty.")
+        return []
+
+def _save():
+    QUEUE[:] = [e for e in QUEUE if not e.get("dropped") and e["sent"] < len(e["parts"])]
+    tmp = OUTBOX_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(QUEUE, f, ensure_ascii=False)
+    os.replace(tmp, OUTBOX_PATH)  # atomic: a crash never leaves a half-written queue
+
+QUEUE: list[dict] = _load()
+_FLUSH_LOCK = asyncio.Lock()
+
+# ------------------------------------------------ main API
+def enqueue(chat: int | str, blocks: list[str]) -> str:
+    """Queue one post for `chat`, split on block boundaries. Returns the entry id."""
+    entry = {
+        "id": uuid.uuid4().hex,
+        "chat": chat,
+        "parts": split_message(blocks),
+        "sent": 0,           # parts already delivered – resumes from here after a restart
+        "attempts": 0,
+        "next_try": 0.0,
+        "created": time.time(),
+    }
+    QUEUE.append(entry)
+    _save()
+    return entry["id"]
+
+async def _drain_chat(bot, entries: list[dict]):
+    for entry in entries:
+        chat, limiter = entry["chat"], _chat_limiter(entry["chat"])
+        while entry["sent"] < len(entry["parts"]):
+            if entry["next_try"] > time.time():
+                return  # keep posts for this chat in order
+            await limiter.wait()
+            await _GLOBAL.wait()
+            try:
+                await bot.send_message(
+                    chat_id=chat,
+                    text=entry["parts"][entry["sent"]],
+                    parse_mode="HTML",
+                    disable_web_page_preview=False,
+                )
+            except RetryAfter as e:
+                # park only this chat; the next flush picks it up once the wait is over
+                wait = _seconds(e.retry_after)
+                print(f"⏳ Flood control for {chat}: retry in {wait:.0f}s")
+                limiter.pause(wait)
+                entry["next_try"] = time.time() + wait
+                _save()
+                return
+            except ChatMigrated as e:
+                print(f"⚠️ Chat {chat} migrated to {e.new_chat_id} – update CHAT_* in .env.")
+                for other in entries:
+                    if other["chat"] == chat:
+                        other["chat"] = e.new_chat_id
+                chat, limiter = e.new_chat_id, _chat_limiter(e.new_chat_id)
+                _save()
+                continue
+            except InvalidToken as e:
+                # nothing can be sent until the config is fixed – keep the queue intact
+                print(f"❌ Telegram rejected the bot token: {e} – outbox kept, flush stopped.")
+                return
+            except (Forbidden, BadRequest) as e:
+                print(f"❌ Telegram rejected part {entry['sent'] + 1}/{len(entry['parts'])} of post "
+                      f"{entry['id']} for {chat}: {e} – dropped ({entry['sent']} part(s) already sent).")
+                entry["dropped"] = True
+                _save()
+                break
+            except TelegramError as e:
+                entry["attempts"] += 1
+                if entry["attempts"] >= MAX_ATTEMPTS:
+                    print(f"❌ Giving up on post {entry['id']} for {chat} after {MAX_ATTEMPTS} attempts: {e} "
+                          f"({entry['sent']}/{len(entry['parts'])} part(s) already sent)")
+                    entry["dropped"] = True
+                    _save()
+                    break
+                backoff = min(BACKOFF_BASE * 2 ** (entry["attempts"] - 1), BACKOFF_MAX)
+                entry["next_try"] = time.time() + backoff
+                print(f"⚠️ Send to {chat} failed (attempt {entry['attempts']}): {e} – retry in {backoff}s")
+                _save()
+                return
+            entry["sent"] += 1
+            entry["attempts"] = 0
+            _save()  # persist every delivered part so a restart never re-sends it
+
+async def flush(bot):
+    """Send everything that is due. Chats drain concurrently; posts within a chat stay ordered."""
+    async with _FLUSH_LOCK:
+        by_chat: dict[str, list[dict]] = {}
+        for entry in QUEUE:
+            by_chat.setdefault(str(entry["chat"]), []).append(entry)
+        await asyncio.gather(*(_drain_chat(bot, entries) for entries in by_chat.values()))
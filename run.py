@@ -8,10 +8,11 @@ from dotenv import load_dotenv
 load_dotenv()  # read .env first
 
 import asyncio, yaml
+from datetime import datetime
 from zoneinfo import ZoneInfo
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from collectors import get_latest_items, get_extras
-from composer import compose_and_send
+from composer import compose_and_send, flush_outbox
 
 with open("config.yaml", "r", encoding="utf-8") as f:
     CONFIG = yaml.safe_load(f)
@@ -55,6 +56,16 @@ def main():
                 timezone=tz,
             )
 
+        # resend anything left in the outbox now, then retry every minute
+        sched.add_job(
+            flush_outbox,
+            "interval",
+            minutes=1,
+            next_run_time=datetime.now(tz),
+            max_instances=1,
+            coalesce=True,
+        )
+
         sched.add_job(
             lambda: print("✅ Bot is still running…", flush=True),
             "interval",
@@ -0,0 +1,137 @@
+# test_outbox.py – splitting, retry and resume behaviour of the Telegram outbox
+#
+# outbox.py imports its error classes from python-telegram-bot, so install the
+# requirements first:  pip install -r requirements.txt pytest && python -m pytest
+import re, json, time, asyncio
+import pytest
+
+import outbox
+from telegram.error import RetryAfter, ChatMigrated, Forbidden, BadRequest, InvalidToken, NetworkError
+
+def _balance(part: str, name: str) -> int:
+    return len(re.findall(rf"<{name}[\s>]", part)) - len(re.findall(rf"</{name}>", part))
+
+class FakeBot:
+    """Records sent texts; `errors` is raised one per call (None means success)."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.sent: list[tuple[int | str, str]] = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        err = self.errors.pop(0) if self.errors else None
+        if err:
+            raise err
+        self.sent.append((chat_id, text))
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    """Point the outbox at a temp file with fresh state and no rate-limit delays."""
+    path = tmp_path / "outbox.json"
+    monkeypatch.setattr(outbox, "OUTBOX_PATH", str(path))
+    monkeypatch.setattr(outbox, "QUEUE", [])
+    monkeypatch.setattr(outbox, "_FLUSH_LOCK", asyncio.Lock())
+    monkeypatch.setattr(outbox, "_GLOBAL", outbox._Limiter(0))
+    monkeypatch.setattr(outbox, "_PER_CHAT", {})
+    monkeypatch.setattr(outbox, "CHANNEL_DELAY", 0)
+    monkeypatch.setattr(outbox, "PRIVATE_DELAY", 0)
+    return path
+
+def _saved(path) -> list[dict]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+# ------------------------------------------------ splitting
+def test_packs_on_item_boundaries():
+    items = ["x" * 1000 for _ in range(9)]
+    parts = outbox.split_message(["hdr", *items, "cta"])
+    assert all(len(p) <= outbox.MAX_MESSAGE_LEN for p in parts)
+    assert "\n\n".join(parts) == "\n\n".join(["hdr", *items, "cta"])
+    assert all(chunk in ("hdr", "cta") or chunk == "x" * 1000
+               for p in parts for chunk in p.split("\n\n"))
+
+def test_short_post_is_one_part():
+    assert outbox.split_message(["hdr", "a", "b"]) == ["hdr\n\na\n\nb"]
+
+@pytest.mark.parametrize("block", [
+    "<b>" + "word " * 1200 + "</b>",
+    '<a href="https://example.com/x">' + "link text &amp; more " * 400 + "</a>",
+    "<b>bold <i>" + "nested " * 1500 + "</i> tail</b>",
+    "<tg-spoiler>" + "word " * 1200 + "</tg-spoiler>",
+])
+def test_oversized_block_keeps_tags_balanced(block):
+    parts = outbox.split_message(["hdr", block, "cta"])
+    assert len(parts) > 1
+    for p in parts:
+        assert len(p) <= outbox.MAX_MESSAGE_LEN
+        for name in ("a", "b", "i", "tg-spoiler"):
+            assert _balance(p, name) == 0
+        assert not re.search(r"&#?\w*$", p.split("</")[0].rstrip())  # no entity cut in half
+
+def test_early_word_break_does_not_fragment_block():
+    assert [len(p) for p in outbox._cut("a " + "x" * 5000, 4096)] == [4096, 906]
+
+def test_tag_longer_than_limit_falls_back_to_plain_text():
+    assert outbox._cut('<a href="' + "x" * 5000 + '">t</a>', 4096) == ["t"]
+
+# ------------------------------------------------ sending
+def test_resume_skips_delivered_parts(queue, monkeypatch):
+    queue.write_text(json.dumps([{
+        "id": "abc", "chat": "@chan", "parts": ["part 0", "part 1"],
+        "sent": 1, "attempts": 0, "next_try": 0.0, "created": 0.0,
+    }]), encoding="utf-8")
+    monkeypatch.setattr(outbox, "QUEUE", outbox._load())
+    bot = FakeBot()
+    asyncio.run(outbox.flush(bot))
+    assert bot.sent == [("@chan", "part 1")]
+    assert _saved(queue) == []
+
+def test_retry_after_parks_only_that_chat(queue):
+    outbox.enqueue("@slow", ["post a"])
+    outbox.enqueue("@fast", ["post b"])
+    bot = FakeBot(RetryAfter(30))
+    asyncio.run(outbox.flush(bot))
+    assert bot.sent == [("@fast", "post b")]
+    [entry] = _saved(queue)
+    assert entry["chat"] == "@slow" and entry["attempts"] == 0
+    assert entry["next_try"] >= time.time() + 25
+
+    outbox.QUEUE[0]["next_try"] = 0.0
+    outbox._PER_CHAT.clear()
+    asyncio.run(outbox.flush(bot))
+    assert bot.sent[-1] == ("@slow", "post a")
+    assert _saved(queue) == []
+
+def test_backoff_holds_later_posts_in_same_chat(queue):
+    outbox.enqueue("@chan", ["first"])
+    outbox.enqueue("@chan", ["second"])
+    bot = FakeBot(NetworkError("boom"))
+    asyncio.run(outbox.flush(bot))
+    assert bot.sent == []
+    first, second = _saved(queue)
+    assert first["attempts"] == 1 and first["next_try"] > time.time()
+    assert second["sent"] == 0
+
+    asyncio.run(outbox.flush(bot))  # still backing off
+    assert bot.sent == []
+
+@pytest.mark.parametrize("error", [Forbidden("blocked"), BadRequest("can't parse entities")])
+def test_permanent_errors_drop_the_post(queue, error):
+    outbox.enqueue("@chan", ["x" * 3000, "y" * 3000])
+    bot = FakeBot(None, error)
+    asyncio.run(outbox.flush(bot))
+    assert len(bot.sent) == 1
+    assert _saved(queue) == []
+
+def test_invalid_token_keeps_the_queue(queue):
+    outbox.enqueue("@chan", ["post"])
+    bot = FakeBot(InvalidToken("revoked"))
+    asyncio.run(outbox.flush(bot))
+    [entry] = _saved(queue)
+    assert entry["sent"] == 0 and entry["attempts"] == 0 and entry["next_try"] == 0.0
+
+def test_chat_migration_resends_to_new_id(queue):
+    outbox.enqueue(-100, ["post"])
+    bot = FakeBot(ChatMigrated(-1001234))
+    asyncio.run(outbox.flush(bot))
+    assert bot.sent == [(-1001234, "post")]
+    assert _saved(queue) == []